@@ -1,14 +1,20 @@
 import os
 import re
-import difflib
+import sys
+import asyncio
 import datetime
 import pytz
 import json
 import uvicorn
 import contextlib
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional, Union, List, Dict
 from collections import defaultdict
 from dotenv import load_dotenv
+from rapidfuzz import fuzz, process
 
 # SQLAlchemy Imports
 from sqlalchemy import create_engine, text
@@ -35,8 +41,38 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST')
 DB_NAME = os.getenv('DB_NAME')
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
+# mysqlclient (MySQLdb) decodes the wire protocol in C, unlike pure-Python PyMySQL
+DATABASE_URL = f"mysql+mysqldb://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}?charset=utf8mb4"
+# Tools run concurrently in worker threads, each holding a pooled connection,
+# so the pool is sized for that instead of SQLAlchemy's default 5 (+10 overflow).
+# Keep MySQL's max_connections >= (size + overflow) x server processes.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '25'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '25'))
+# Connections are recycled before MySQL's wait_timeout can drop them
+DB_POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE_SECONDS', '1800'))
+
+# The server only reads, so statements run in autocommit mode instead of
+# opening (and rolling back) an implicit transaction per connection
+engine = create_engine(
+    DATABASE_URL,
+    isolation_level="AUTOCOMMIT",
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=True,  # Replace connections the server closed while idle
+    pool_use_lifo=True   # Reuse the most recent connection so idle ones can expire
+)
+
+# Reference tables (users, products, clinics, customers) change rarely,
+# so their loaded maps (and the all-time salesman transaction totals, which
+# reports tolerate being this stale) are reused this long before re-querying
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
+# The server reloads them in the background this often, ahead of the TTL,
+# so requests keep hitting a warm cache
+CACHE_REFRESH_SECONDS = int(os.getenv('CACHE_REFRESH_SECONDS', '240'))
+
+# Rows fetched per round trip when streaming large result sets (server-side cursor)
+STREAM_BATCH_SIZE = 10_000
 
 # ==========================================
 # 2. MCP SERVER INSTANCE
@@ -50,108 +86,293 @@ mcp = FastMCP(
     )
 )
 
+def threaded_tool(func):
+    """
+    Registers func as an MCP tool that runs in a worker thread.
+    FastMCP calls sync tools directly on the event loop, so one slow query would
+    stall every other MCP session. func itself is returned unchanged for the
+    REST endpoints, which FastAPI already runs in its threadpool.
+    """
+    @functools.wraps(func)
+    async def run_in_thread(**kwargs):
+        return await asyncio.to_thread(func, **kwargs)
+
+    mcp.tool()(run_in_thread)
+    return func
+
 # ==========================================
 # 3. HELPER FUNCTIONS
 # ==========================================
 
+# --- PRECOMPILED PATTERNS ---
+
+# Degree suffixes (Sp.Ort, M.Kes, Cert.Ort) are stripped from names in a single pass
+_RE_NAME_SUFFIXES = re.compile(r'\bsp[\s\.]*ort[a-z]*\b|\bm[\s\.]*kes\b|\bcert[\s\.]*ort[a-z]*\b')
+_NAME_TITLES = frozenset({
+    'drg', 'dr', 'drs', 'dra', 'sp', 'spd', 'ort', 'orto', 'mm', 'mkes',
+    'cert', 'fisid', 'kg', 'mha', 'sph', 'amd', 'skg'
+})
+_RE_CLINIC_PREFIXES = re.compile(r'\b(klinik|apotek|praktek|rs|rsia|rsu|dr|drg)\b')
+# Salesman prefixes, digit runs and non-alphanumerics all become spaces in one scan
+_RE_SALESMAN_NOISE = re.compile(r'\b(?:ps|dc|am|ts|cr|ac|sm|hr|mr|ms|mrs|dr)\b|\d+|[\W_]')
+_RE_SALESMAN_CODE = re.compile(r'\b(ps|dc|am|ts|cr|ac|sm|hr)[\s\-\.]*(\d+)\b')
+_RE_DIGITS = re.compile(r'\d+')
+_RE_LOOSE_DIGITS = re.compile(r'\b\d+\b')
+# Separators between salesmen sharing one transaction ("PS5 / DC3 & AM1")
+_RE_SALESMAN_SEPARATORS = re.compile(r'[/\&,]')
+
+# Placeholder strings treated as missing values
+_NULL_LEVELS = frozenset({'null', 'none', ''})
+_EMPTY_CUSTOMER_IDS = frozenset({'none', 'nan', ''})
+_EMPTY_PHONES = frozenset({'null', 'none', 'nan'})
+
+class _CharClassTable(dict):
+    """
+    str.translate() table standing in for a single-character regex class.
+    Each code point is classified on first sight and memoized, so the table
+    covers the full Unicode range exactly like the regex it replaces.
+    """
+    def __init__(self, keep, replacement):
+        super().__init__()
+        self.keep = keep
+        self.replacement = replacement
+
+    def __missing__(self, code):
+        value = code if self.keep(chr(code)) else self.replacement
+        self[code] = value
+        return value
+
+# Equivalent to re.sub(r'[^\w\s]', ' ', ...) and re.sub(r'\D', '', ...)
+_NON_WORD_TO_SPACE = _CharClassTable(lambda ch: ch.isalnum() or ch == '_' or ch.isspace(), ord(' '))
+_DROP_NON_DIGITS = _CharClassTable(str.isdecimal, None)
+
+# Equivalent to re.sub(r'[.,\-]', ' ', ...)
+_NAME_PUNCT_TO_SPACE = str.maketrans('.,-', '   ')
+
+# The normalizers are pure and the same raw names recur across rows, requests
+# and cache reloads, so their results are memoized (bounded, least recent evicted)
+_NORMALIZE_CACHE_SIZE = 131072
+
+@functools.lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def normalize_name(text: str) -> str:
     if not text: return ""
     core = text.lower()
-    core = re.sub(r'\bsp[\s\.]*ort[a-z]*\b', '', core)
-    core = re.sub(r'\bm[\s\.]*kes\b', '', core)
-    core = re.sub(r'\bcert[\s\.]*ort[a-z]*\b', '', core)
-    core = re.sub(r'[.,\-]', ' ', core)
-    titles = {
-        'drg', 'dr', 'drs', 'dra', 'sp', 'spd', 'ort', 'orto', 'mm', 'mkes', 
-        'cert', 'fisid', 'kg', 'mha', 'sph', 'amd', 'skg'
-    }
-    tokens = core.split()
-    clean_tokens = [t for t in tokens if t not in titles]
-    return " ".join(clean_tokens)
+    # Most names carry no degree suffix (all contain 'ort' or 'kes') and no
+    # punctuation, so each pass only runs when it could change something
+    if 'ort' in core or 'kes' in core:
+        core = _RE_NAME_SUFFIXES.sub('', core)
+    if '.' in core or ',' in core or '-' in core:
+        core = core.translate(_NAME_PUNCT_TO_SPACE)
+    return " ".join(t for t in core.split() if t not in _NAME_TITLES)
 
 def normalize_phone(phone: str) -> str:
-    if not phone or str(phone).lower() in ['null', 'none', 'nan']:
+    if not phone or str(phone).lower() in _EMPTY_PHONES:
         return None
-    clean_num = re.sub(r'\D', '', str(phone))
+    clean_num = str(phone).translate(_DROP_NON_DIGITS)
     if clean_num.startswith('62'):
         clean_num = '0' + clean_num[2:]
     return clean_num
 
+@functools.lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def normalize_product_name(text: str) -> str:
     if not text: return ""
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', ' ', text)
-    return " ".join(text.split())
+    return " ".join(text.lower().translate(_NON_WORD_TO_SPACE).split())
 
+@functools.lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def normalize_clinic_name(text: str) -> str:
     if not text: return ""
-    text = text.lower()
-    prefixes = r'\b(klinik|apotek|praktek|rs|rsia|rsu|dr|drg)\b'
-    text = re.sub(prefixes, ' ', text)
-    text = re.sub(r'[^\w\s]', ' ', text)
+    text = _RE_CLINIC_PREFIXES.sub(' ', text.lower())
+    text = text.translate(_NON_WORD_TO_SPACE)
     return " ".join(text.split())
 
 def extract_salesman_code(text: str) -> str:
     if not text: return None
-    pattern = r'\b(ps|dc|am|ts|cr|ac|sm|hr)[\s\-\.]*(\d+)\b'
-    match = re.search(pattern, text.lower())
+    match = _RE_SALESMAN_CODE.search(text.lower())
     if match:
         return f"{match.group(1)}{match.group(2)}"
     return None
 
+@functools.lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def clean_salesman_name(text: str) -> str:
     if not text: return ""
-    text = text.lower()
-    prefixes = r'\b(ps|dc|am|ts|cr|ac|sm|hr|mr|ms|mrs|dr)\b'
-    text = re.sub(prefixes, ' ', text)
-    text = re.sub(r'\d+', ' ', text)
-    text = re.sub(r'[\W_]', ' ', text)
-    return " ".join(text.split())
+    return " ".join(_RE_SALESMAN_NOISE.sub(' ', text.lower()).split())
 
 def get_fuzzy_match(name, existing_names, threshold=0.9):
-    matches = difflib.get_close_matches(name, existing_names, n=1, cutoff=threshold)
-    return matches[0] if matches else None
+    match = process.extractOne(name, existing_names, scorer=fuzz.ratio, score_cutoff=threshold * 100)
+    return match[0] if match else None
 
-def resolve_salesman_identity(raw_text, code_map, digit_map, name_list):
-    clean_text = raw_text.lower().strip()
+def _resolve_salesman_by_code(clean_text, code_map, digit_map):
     extracted_code = extract_salesman_code(clean_text)
     if extracted_code and extracted_code in code_map:
         return code_map[extracted_code]
-    loose_digits = re.findall(r'\b\d+\b', clean_text)
+    loose_digits = _RE_LOOSE_DIGITS.findall(clean_text)
     for d in loose_digits:
         if d in digit_map:
             return digit_map[d]
-    core_name = clean_salesman_name(clean_text)
-    if not core_name: return None
-    official_names = [x['name'] for x in name_list]
-    match_name = get_fuzzy_match(core_name, official_names, threshold=0.80) 
-    if match_name:
-        for u in name_list:
-            if u['name'] == match_name:
-                return u['id']
     return None
 
+def resolve_salesman_identity(raw_text, code_map, digit_map, name_map):
+    """
+    Resolves a raw salesman string to an official user ID, or None.
+    """
+    clean_text = raw_text.lower().strip()
+    resolved_id = _resolve_salesman_by_code(clean_text, code_map, digit_map)
+    if resolved_id: return resolved_id
+    core_name = clean_salesman_name(clean_text)
+    if not core_name: return None
+    # name_map is {id: clean name}; extractOne returns the key of the best match
+    match = process.extractOne(core_name, name_map, scorer=fuzz.ratio, score_cutoff=80)
+    return match[2] if match else None
+
+def resolve_salesman_identities(raw_texts, code_map, digit_map, name_map):
+    """
+    Batch form of resolve_salesman_identity for many raw strings.
+    Code and digit lookups run per string; the fuzzy fallback for every
+    remaining name is scored in one RapidFuzz cdist call.
+    Returns: {raw_text: id or None}
+    """
+    resolved = {}
+    pending = defaultdict(list)  # core name -> raw strings awaiting the fuzzy pass
+    for raw_text in raw_texts:
+        if raw_text in resolved: continue
+        clean_text = raw_text.lower().strip()
+        resolved[raw_text] = _resolve_salesman_by_code(clean_text, code_map, digit_map)
+        if not resolved[raw_text]:
+            core_name = clean_salesman_name(clean_text)
+            if core_name: pending[core_name].append(raw_text)
+
+    if pending and name_map:
+        core_names = list(pending)
+        user_ids = list(name_map)
+        # Scores below the cutoff come back as 0; argmax keeps the first best user like extractOne
+        scores = process.cdist(core_names, list(name_map.values()), scorer=fuzz.ratio,
+                               score_cutoff=80, dtype='float64', workers=-1)
+        for core_name, row in zip(core_names, scores):
+            best = int(row.argmax())
+            if row[best]:
+                for raw_text in pending[core_name]:
+                    resolved[raw_text] = user_ids[best]
+    return resolved
+
+@functools.lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
 def standardize_customer_id(text: str) -> str:
     """
     Standardizes Customer ID to 'CIDxxxxx' format.
     Removes 'B-' prefixes and ensures numeric part is prefixed with CID.
     """
-    if not text or str(text).lower() in ['none', 'nan', '']:
+    if not text:
+        return "N/A"
+    # Most IDs already arrive standardized ('CID00196'); keep them as they are
+    if isinstance(text, str) and text.startswith('CID') and text[3:].isdecimal():
+        return text
+    if str(text).lower() in _EMPTY_CUSTOMER_IDS:
         return "N/A"
     
     clean = str(text).upper().strip()
     
-    # Specific fix for "B-CID..." format mentioned
-    clean = re.sub(r'^B[-_]*', '', clean)
+    # Specific fix for "B-CID..." format mentioned (same as stripping ^B[-_]*)
+    if clean.startswith('B'):
+        clean = clean[1:].lstrip('-_')
     
     # Extract digits. If digits exist, format as CID{digits}
     # This preserves leading zeros (e.g. 00196) if they exist in the text
-    digits = re.search(r'\d+', clean)
+    digits = _RE_DIGITS.search(clean)
     if digits:
         return f"CID{digits.group()}"
     
     return clean
 
+# --- REFERENCE DATA CACHE ---
+
+# Every loader wrapped by ttl_cache, in registration order
+_CACHED_LOADERS = []
+
+def ttl_cache(loader=None, *, background=True):
+    """
+    Caches the result of a zero-argument loader for CACHE_TTL_SECONDS.
+    Callers share the returned objects, so they must not mutate them.
+    Use loader.cache_clear() to force a reload.
+    With background=False the loader is skipped by the startup preload and the
+    periodic refresh, and only reloads on first use after its TTL expires.
+    """
+    if loader is None:
+        return functools.partial(ttl_cache, background=background)
+
+    lock = threading.Lock()
+    state = {"expires": 0.0, "value": None}
+
+    @functools.wraps(loader)
+    def wrapper():
+        with lock:
+            if time.monotonic() >= state["expires"]:
+                state["value"] = loader()
+                state["expires"] = time.monotonic() + CACHE_TTL_SECONDS
+            return state["value"]
+
+    def cache_clear():
+        with lock:
+            state["expires"] = 0.0
+            state["value"] = None
+
+    def cache_refresh():
+        # Reload outside the lock so readers keep the current value meanwhile
+        value = loader()
+        with lock:
+            state["value"] = value
+            state["expires"] = time.monotonic() + CACHE_TTL_SECONDS
+
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_refresh = cache_refresh
+    wrapper.background = background
+    _CACHED_LOADERS.append(wrapper)
+    return wrapper
+
+def invalidate_caches() -> int:
+    """
+    Drops the cached maps kept out of the periodic refresh (background=False)
+    so their next call reloads from the database. Returns how many were dropped.
+    """
+    lazy_loaders = [loader for loader in _CACHED_LOADERS if not loader.background]
+    for loader in lazy_loaders:
+        loader.cache_clear()
+    return len(lazy_loaders)
+
+def preload_reference_data():
+    """
+    Loads every cached reference map concurrently, each on its own pooled
+    connection, so a cold start waits for the slowest query rather than the sum.
+    """
+    loaders = [loader for loader in _CACHED_LOADERS if loader.background]
+    with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+        futures = [executor.submit(loader) for loader in loaders]
+        for future in futures:
+            future.result()
+
+def refresh_reference_data():
+    """
+    Reloads every cached reference map in place, in registration order
+    (so derived maps such as load_product_matcher see fresh inputs).
+    """
+    for loader in _CACHED_LOADERS:
+        if loader.background:
+            loader.cache_refresh()
+
+async def refresh_reference_data_periodically():
+    while True:
+        await asyncio.sleep(CACHE_REFRESH_SECONDS)
+        refresh = asyncio.ensure_future(asyncio.to_thread(refresh_reference_data))
+        try:
+            await asyncio.shield(refresh)
+        except asyncio.CancelledError:
+            # A thread cannot be interrupted, so let an in-flight reload finish
+            # before shutdown goes on to tear down the engine
+            with contextlib.suppress(Exception):
+                await refresh
+            raise
+        except Exception as e:
+            print(f"Reference data refresh failed: {e}")
+
+@ttl_cache
 def load_name_to_cid_map():
     """
     Loads a mapping of Normalized Name -> CID from acc_customers.
@@ -160,9 +381,9 @@ def load_name_to_cid_map():
     name_to_cid = {}
     query = text("SELECT cid, cust_name FROM acc_customers")
     with engine.connect() as conn:
-        for row in conn.execute(query):
+        for row in conn.execute(query, execution_options={"yield_per": STREAM_BATCH_SIZE}):
             if row.cid and row.cust_name:
-                clean_name = normalize_name(row.cust_name)
+                clean_name = sys.intern(normalize_name(row.cust_name))
                 if clean_name:
                     std_cid = standardize_customer_id(row.cid)
                     name_to_cid[clean_name] = std_cid
@@ -170,32 +391,29 @@ def load_name_to_cid_map():
 
 # --- DATABASE LOADERS ---
 
+@ttl_cache
 def load_official_users_map():
-    id_map, code_map, digit_map, name_list = {}, {}, {}, []
+    id_map, code_map, digit_map, name_map = {}, {}, {}, {}
     digit_counts = defaultdict(int)
     temp_digit_to_id = {}
     
-    query = text("SELECT id, username, name, level FROM users")
+    query = text("SELECT CAST(id AS CHAR) AS id, username, name, level FROM users")
     with engine.connect() as conn:
-        result = conn.execute(query)
-        for row in result:
-            u_id = str(row.id)
-            code = str(row.username).lower().strip() 
-            name = row.name
+        # Rows are unpacked positionally to avoid per-field Row attribute lookups
+        for u_id, username, name, raw_level in conn.execute(query):
+            code = str(username).lower().strip()
             
-            raw_level = row.level
-            if not raw_level or str(raw_level).lower() in ['null', 'none', '']:
+            if not raw_level or str(raw_level).lower() in _NULL_LEVELS:
                 level = "NULL"
             else:
                 level = str(raw_level).upper().strip()
 
-            id_map[u_id] = {"id": u_id, "code": row.username, "name": name, "level": level}
+            id_map[u_id] = {"id": u_id, "code": username, "name": name, "level": level}
             
             code_map[code] = u_id
-            clean_n = normalize_name(name) 
-            name_list.append({"id": u_id, "name": clean_n})
+            name_map[u_id] = sys.intern(normalize_name(name))
             
-            digits = re.search(r'\d+', code)
+            digits = _RE_DIGITS.search(code)
             if digits:
                 d_str = digits.group()
                 digit_counts[d_str] += 1
@@ -205,66 +423,79 @@ def load_official_users_map():
         if count == 1:
             digit_map[d_str] = temp_digit_to_id[d_str]
             
-    return id_map, code_map, digit_map, name_list
+    return id_map, code_map, digit_map, name_map
 
+@ttl_cache
 def load_customer_directory():
     targets = []
-    query = text("SELECT id, custname FROM customers")
+    query = text("SELECT CAST(id AS CHAR) AS id, custname FROM customers")
     with engine.connect() as conn:
-        result = conn.execute(query)
-        for row in result:
-            if row.custname:
+        for cust_id, custname in conn.execute(query, execution_options={"yield_per": STREAM_BATCH_SIZE}):
+            if custname:
                 targets.append({
-                    "id": str(row.id),
-                    "name": row.custname,
-                    "clean": normalize_name(row.custname)
+                    "id": cust_id,
+                    "name": custname,
+                    "clean": sys.intern(normalize_name(custname))
                 })
     return targets
 
+@ttl_cache
 def load_acc_cid_map():
     mapping = {}
     query = text("SELECT cid, cust_name FROM acc_customers")
     with engine.connect() as conn:
-        result = conn.execute(query)
-        for row in result:
-            if row.cid:
-                mapping[str(row.cid).strip()] = row.cust_name
+        for cid, cust_name in conn.execute(query, execution_options={"yield_per": STREAM_BATCH_SIZE}):
+            if cid:
+                mapping[str(cid).strip()] = cust_name
     return mapping
 
+@ttl_cache
 def load_product_directory():
     id_map, name_list = {}, []
-    query = text("SELECT id, prodname FROM products")
+    query = text("SELECT CAST(id AS CHAR) AS id, prodname FROM products")
     with engine.connect() as conn:
-        result = conn.execute(query)
-        for row in result:
-            p_id = str(row.id)
-            p_name = row.prodname
+        for p_id, p_name in conn.execute(query):
             id_map[p_id] = p_name
             name_list.append({
                 "id": p_id,
                 "name": p_name,
-                "clean": normalize_product_name(p_name)
+                "clean": sys.intern(normalize_product_name(p_name))
             })
     return id_map, name_list
 
+@ttl_cache
+def load_product_matcher():
+    """
+    Official products ordered longest clean name first (so the most specific
+    name wins a phrase match), plus their clean names and phrase index.
+    Returns: (id_map, ordered_products, clean_names, phrase_index)
+    """
+    id_map, name_list = load_product_directory()
+    ordered = sorted(name_list, key=lambda x: len(x['clean']), reverse=True)
+    return id_map, ordered, [x['clean'] for x in ordered], build_product_phrase_index(ordered)
+
+@ttl_cache
 def load_clinic_directory():
     city_buckets = defaultdict(list)
-    query = text("SELECT id, clinicname, citycode FROM clinics")
+    query = text("SELECT CAST(id AS CHAR) AS id, clinicname, COALESCE(citycode, '') AS citycode FROM clinics")
+    # Many clinics share a city, so each distinct citycode is cleaned and
+    # bucketed once: raw citycode -> (bucket key, display city)
+    city_slots = {}
     with engine.connect() as conn:
-        result = conn.execute(query)
-        for row in result:
-            c_id = str(row.id)
-            name = row.clinicname
-            raw_city = str(row.citycode).strip() if row.citycode else ""
-            if raw_city.lower() == "pilih kota/kab" or not raw_city:
-                clean_city = "-"
-            else:
-                clean_city = raw_city
-            bucket_key = clean_city.upper()
+        for c_id, name, citycode in conn.execute(query, execution_options={"yield_per": STREAM_BATCH_SIZE}):
+            slot = city_slots.get(citycode)
+            if slot is None:
+                raw_city = citycode.strip()
+                if raw_city.lower() == "pilih kota/kab" or not raw_city:
+                    clean_city = "-"
+                else:
+                    clean_city = raw_city
+                slot = city_slots[citycode] = (clean_city.upper(), clean_city)
+            bucket_key, clean_city = slot
             city_buckets[bucket_key].append({
                 "id": c_id,
                 "name": name,
-                "clean": normalize_clinic_name(name),
+                "clean": sys.intern(normalize_clinic_name(name)),
                 "city_display": clean_city
             })
     return city_buckets
@@ -285,13 +516,89 @@ def get_default_dates(start_date: Optional[str], end_date: Optional[str]):
 
 # --- ANALYTICAL HELPERS ---
 
-def find_salesman_id_by_name(name_query: str):
+def count_salesman_parts(rows):
+    """
+    Splits each grouped salesman_name (e.g. "PS5 / DC3") into its parts and
+    sums the group counts per distinct part.
+    rows: iterable of (salesman_name, count)
+    """
+    part_counts = defaultdict(int)
+    for salesman_name, count in rows:
+        for part in _RE_SALESMAN_SEPARATORS.split(str(salesman_name)):
+            part = part.strip()
+            if part: part_counts[part] += count
+    return part_counts
+
+def fetch_all_rows(query):
+    """
+    Runs a parameterless statement on its own pooled connection and returns all rows.
+    """
+    with engine.connect() as conn:
+        return conn.execute(query).fetchall()
+
+# Statements issued by more than one tool, defined once at module level
+PLANS_PER_USER_QUERY = text("SELECT CAST(userid AS CHAR) AS userid, COUNT(*) as c FROM plans GROUP BY userid")
+REPORTS_PER_USER_QUERY = text(
+    "SELECT CAST(p.userid AS CHAR) AS userid, COUNT(r.id) as c FROM reports r JOIN plans p ON r.idplan = p.id GROUP BY p.userid"
+)
+
+# Transaction counts per salesman_name. Identity resolution ignores case and
+# padding, so spelling variants are merged by the database before reaching Python
+SALESMAN_TRANSACTION_COUNTS_QUERY = text("""
+    SELECT LOWER(TRIM(salesman_name)) as salesman_name, COUNT(*) as c
+    FROM transactions
+    GROUP BY LOWER(TRIM(salesman_name))
+""")
+
+@ttl_cache(background=False)
+def load_salesman_transaction_part_counts():
+    """
+    All-time transaction counts per salesman_name part (see count_salesman_parts),
+    so the undated tools do not rescan transactions on every call.
+    Only these totals may be up to CACHE_TTL_SECONDS stale; plan and visit
+    counts are always queried live. Loaded on demand only; idle servers never rescan.
+    """
+    with engine.connect() as conn:
+        return count_salesman_parts(conn.execute(SALESMAN_TRANSACTION_COUNTS_QUERY))
+
+def build_product_phrase_index(official_products):
+    """
+    Indexes official products by clean name for find_product_in_text().
+    Keeps each product's position so list order still decides between hits.
+    """
+    phrase_index = {}
+    for position, official in enumerate(official_products):
+        if official['clean']:
+            phrase_index.setdefault(official['clean'], (position, official))
+    return phrase_index
+
+def find_product_in_text(clean_text: str, phrase_index):
+    """
+    Returns the first official product (in list order) whose clean name occurs
+    as a whole-word phrase of clean_text, or None.
+    Same result as testing f" {clean} " in f" {clean_text} " against every product,
+    but only the word n-grams of clean_text are looked up.
+    """
+    words = clean_text.split(' ')
+    best = None
+    for i in range(len(words)):
+        phrase = words[i]
+        for j in range(i + 1, len(words) + 1):
+            if j > i + 1:
+                phrase = f"{phrase} {words[j - 1]}"
+            hit = phrase_index.get(phrase)
+            if hit and (best is None or hit[0] < best[0]):
+                best = hit
+    return best[1] if best else None
+
+def find_salesman_id_by_name(name_query: str, users_map=None):
     """
     Searches for a salesman's Official ID based on a name string.
+    users_map: optional result of load_official_users_map() already held by the caller.
     Returns: (id, name) or (None, None)
     """
-    id_map, code_map, digit_map, name_list = load_official_users_map()
-    resolved_id = resolve_salesman_identity(name_query, code_map, digit_map, name_list)
+    id_map, code_map, digit_map, name_map = users_map or load_official_users_map()
+    resolved_id = resolve_salesman_identity(name_query, code_map, digit_map, name_map)
     if resolved_id:
         return resolved_id, id_map[resolved_id]['name']
     return None, None
@@ -302,25 +609,23 @@ def fetch_single_salesman_data(salesman_name: str) -> Dict[str, Any]:
     Returns a Dictionary object.
     """
     # 1. Identify Salesman
-    target_id, official_name = find_salesman_id_by_name(salesman_name)
+    users_map = load_official_users_map()
+    target_id, official_name = find_salesman_id_by_name(salesman_name, users_map)
     
     if not target_id:
         return {"error": f"Could not find salesman '{salesman_name}'."}
     
     # 2. Get Transaction Count
-    id_map, code_map, digit_map, name_list = load_official_users_map()
+    id_map, code_map, digit_map, name_map = users_map
+    part_counts = load_salesman_transaction_part_counts()
+
+    # Many salesman_name groups share the same parts (e.g. "PS5" and "PS5 / DC3"),
+    # so each distinct part is resolved only once, in one batch
+    resolved_ids = resolve_salesman_identities(part_counts, code_map, digit_map, name_map)
     transaction_count = 0
-    
-    query_trans = text("SELECT salesman_name, COUNT(*) as c FROM transactions GROUP BY salesman_name")
-    with engine.connect() as conn:
-        for row in conn.execute(query_trans):
-            parts = re.split(r'[/\&,]', str(row.salesman_name))
-            for part in parts:
-                part = part.strip()
-                if not part: continue
-                resolved = resolve_salesman_identity(part, code_map, digit_map, name_list)
-                if resolved == target_id:
-                    transaction_count += row.c
+    for part, count in part_counts.items():
+        if resolved_ids[part] == target_id:
+            transaction_count += count
 
     # 3. Count Total Visits (use COUNT on reports, not len of notes)
     visit_notes = []
@@ -330,10 +635,6 @@ def fetch_single_salesman_data(salesman_name: str) -> Dict[str, Any]:
         JOIN plans p ON r.idplan = p.id
         WHERE p.userid = :uid
     """)
-    with engine.connect() as conn:
-        row = conn.execute(visit_count_query, {"uid": target_id}).fetchone()
-        total_visits = int(row.c) if row and row.c else 0
-
     # 4. Get Recent Visit Notes (limited to 50)
     query_notes = text("""
         SELECT r.visitnote 
@@ -344,7 +645,11 @@ def fetch_single_salesman_data(salesman_name: str) -> Dict[str, Any]:
         LIMIT 30
     """)
     
+    # Both statements share one pool checkout (and its liveness ping)
     with engine.connect() as conn:
+        row = conn.execute(visit_count_query, {"uid": target_id}).fetchone()
+        total_visits = int(row.c) if row and row.c else 0
+
         result = conn.execute(query_notes, {"uid": target_id})
         for row in result:
             if row.visitnote and str(row.visitnote).strip():
@@ -367,100 +672,143 @@ def fetch_best_performers_logic(start_date: str, end_date: str) -> Dict[str, Any
     """
 
     # --- 1. PRE-LOAD REFERENCE MAPS ---
-    id_map, code_map, digit_map, name_list = load_official_users_map()
-    prod_id_map, official_products = load_product_directory()
-    official_products.sort(key=lambda x: len(x['clean']), reverse=True)
-    target_product_cleans = [x['clean'] for x in official_products]
+    id_map, code_map, digit_map, name_map = load_official_users_map()
+    _, _, target_product_cleans, product_phrases = load_product_matcher()
 
     # Stats Container
     stats = defaultdict(lambda: {"name": "Unknown", "visits": 0, "trans": 0, "rev": 0})
     product_stats = defaultdict(int)
 
     with engine.connect() as conn:
-        # --- 2. PROCESS VISITS ---
-        visit_query = text("""
-            SELECT p.userid, u.name, COUNT(r.id) as visit_count
+        # --- 2. FETCH VISIT & SALESMAN TRANSACTION TOTALS ---
+        # Both grouped sets come back from one statement (one round trip), tagged
+        # by 'kind'. Visits are keyed by user ID, transactions by the raw
+        # salesman_name, which is only resolved to a user in Python.
+        # amount and qty are truncated per row before summing, as int() did
+        # when these totals were accumulated row by row in Python.
+        totals_query = text("""
+            SELECT 'visit' as kind, p.userid as group_key, u.name as user_name,
+                   COUNT(r.id) as row_count, NULL as revenue
             FROM reports r
             JOIN plans p ON r.idplan = p.id
             JOIN users u ON p.userid = u.id
             WHERE r.date BETWEEN :start AND :end
             GROUP BY p.userid, u.name
-        """)
-        
-        result_visits = conn.execute(visit_query, {"start": start_date, "end": end_date})
-        for row in result_visits:
-            u_id = str(row.userid)
-            stats[u_id]["visits"] = row.visit_count
-            stats[u_id]["name"] = row.name 
-
-        # --- 3. PROCESS TRANSACTIONS ---
-        trans_query = text("""
-            SELECT salesman_name, product, qty, amount 
+            UNION ALL
+            SELECT 'trans' as kind, LOWER(TRIM(salesman_name)) as group_key, NULL as user_name,
+                   COUNT(*) as row_count, SUM(TRUNCATE(amount, 0) * TRUNCATE(qty, 0)) as revenue
             FROM transactions
             WHERE inv_date BETWEEN :start AND :end
+            GROUP BY LOWER(TRIM(salesman_name))
         """)
         
-        result_trans = conn.execute(trans_query, {"start": start_date, "end": end_date})
-        
-        for row in result_trans:
-            raw_salesman = str(row.salesman_name) if row.salesman_name else ""
-            raw_product = str(row.product) if row.product else ""
-            qty = int(row.qty) if row.qty else 0
-            revenue = int(row.amount) * qty if row.amount else 0
-
-            # --- A. RESOLVE SALESMAN ---
-            resolved_id = resolve_salesman_identity(raw_salesman, code_map, digit_map, name_list)
-            target_key = None
+        salesman_rows = []
+        for kind, group_key, user_name, row_count, amount_total in conn.execute(
+            totals_query, {"start": start_date, "end": end_date}
+        ):
+            if kind == 'visit':
+                u_id = str(group_key)
+                stats[u_id]["visits"] = row_count
+                stats[u_id]["name"] = user_name
+            else:
+                salesman_rows.append((
+                    str(group_key) if group_key else "",
+                    row_count,
+                    int(amount_total) if amount_total else 0
+                ))
+
+        # --- 3. ATTRIBUTE TRANSACTIONS TO SALESMEN ---
+        # Every distinct salesman_name is resolved once, in a single batch
+        resolved_ids = resolve_salesman_identities(
+            [raw_salesman for raw_salesman, _, _ in salesman_rows], code_map, digit_map, name_map
+        )
+
+        for raw_salesman, trans_count, revenue in salesman_rows:
+            resolved_id = resolved_ids[raw_salesman]
             if resolved_id:
-                target_key = resolved_id
-                if stats[target_key]["name"] == "Unknown":
-                    stats[target_key]["name"] = id_map[resolved_id]['name']
+                target_key, display_name = resolved_id, id_map[resolved_id]['name']
             else:
-                clean_n = clean_salesman_name(raw_salesman).title()
-                if clean_n:
-                    target_key = clean_n
-                    if stats[target_key]["name"] == "Unknown":
-                        stats[target_key]["name"] = clean_n
+                display_name = clean_salesman_name(raw_salesman).title()
+                target_key = display_name or None
 
             if target_key:
-                stats[target_key]["trans"] += 1 
+                if stats[target_key]["name"] == "Unknown":
+                    stats[target_key]["name"] = display_name
+                stats[target_key]["trans"] += trans_count
                 stats[target_key]["rev"] += revenue
 
-            # --- B. RESOLVE PRODUCT ---
+        # --- 4. PROCESS TRANSACTIONS (PER PRODUCT) ---
+        product_query = text("""
+            SELECT product, SUM(TRUNCATE(qty, 0)) as units
+            FROM transactions
+            WHERE inv_date BETWEEN :start AND :end
+            GROUP BY product
+        """)
+        
+        # Long date ranges can still yield many groups; stream them in batches
+        # (server-side cursor) instead of buffering the whole result set first
+        result_products = conn.execute(
+            product_query, {"start": start_date, "end": end_date},
+            execution_options={"yield_per": STREAM_BATCH_SIZE}
+        )
+        
+        # Rows are unpacked positionally (column order of product_query) to skip
+        # the per-field attribute lookups on SQLAlchemy Row objects
+        product_rows = []  # (clean name, units, matched official name) in row order
+        fuzzy_products = {}  # clean names the phrase index missed -> fuzzy match
+        for product, units in result_products:
+            raw_product = str(product) if product else ""
+            qty = int(units) if units else 0
+
             clean_prod = normalize_product_name(raw_product)
-            match_found = False
+            if not clean_prod: continue
             
-            if clean_prod:
-                for official in official_products:
-                    if f" {official['clean']} " in f" {clean_prod} ":
-                        product_stats[official['name']] += qty
-                        match_found = True
-                        break
-                if not match_found:
-                    fuzzy_match = get_fuzzy_match(clean_prod, target_product_cleans, threshold=0.75)
-                    if fuzzy_match:
-                        official_entry = next((x for x in official_products if x['clean'] == fuzzy_match), None)
-                        if official_entry:
-                            product_stats[official_entry['name']] += qty
-                            match_found = True
-            if not match_found and clean_prod:
-                product_stats[clean_prod.title()] += qty
-
-    # --- 4. CALCULATE WINNERS ---
-    stats_list = list(stats.values())
-    
-    # Calculate Winners
-    winner_visits = max(stats_list, key=lambda x: x['visits']) if stats_list else None
-    winner_trans = max(stats_list, key=lambda x: x['trans']) if stats_list else None
-    winner_revenue = max(stats_list, key=lambda x: x['rev']) if stats_list else None
-    
-    eligible_conv = [s for s in stats_list if s['visits'] > 0]
-    winner_conv = max(eligible_conv, key=lambda x: x['trans'] / x['visits']) if eligible_conv else None
+            official = find_product_in_text(clean_prod, product_phrases)
+            if official:
+                product_rows.append((clean_prod, qty, official['name']))
+            else:
+                product_rows.append((clean_prod, qty, None))
+                fuzzy_products[clean_prod] = None
+
+    # Products the phrase index could not place are scored against every official
+    # product in one cdist call; argmax keeps the first best name like extractOne
+    if fuzzy_products and target_product_cleans:
+        unmatched = list(fuzzy_products)
+        scores = process.cdist(unmatched, target_product_cleans, scorer=fuzz.ratio,
+                               score_cutoff=75, dtype='float64', workers=-1)
+        for clean_prod, row in zip(unmatched, scores):
+            best = int(row.argmax())
+            if row[best] and target_product_cleans[best] in product_phrases:
+                fuzzy_products[clean_prod] = product_phrases[target_product_cleans[best]][1]['name']
+
+    for clean_prod, qty, product_key in product_rows:
+        if product_key is None:
+            product_key = fuzzy_products.get(clean_prod)
+        if product_key is None:
+            product_key = clean_prod.title()
+        product_stats[product_key] += qty
+
+    # --- 5. CALCULATE WINNERS ---
+    # Visit and transaction totals only settle once both passes are done, so the
+    # winners are picked in a single scan afterwards (first entry wins ties, as max() does)
+    winner_visits = winner_trans = winner_revenue = winner_conv = None
+    best_conv_ratio = None
+    for entry in stats.values():
+        if winner_visits is None or entry['visits'] > winner_visits['visits']:
+            winner_visits = entry
+        if winner_trans is None or entry['trans'] > winner_trans['trans']:
+            winner_trans = entry
+        if winner_revenue is None or entry['rev'] > winner_revenue['rev']:
+            winner_revenue = entry
+        if entry['visits'] > 0:
+            ratio = entry['trans'] / entry['visits']
+            if best_conv_ratio is None or ratio > best_conv_ratio:
+                winner_conv, best_conv_ratio = entry, ratio
     
     best_prod_name = max(product_stats, key=product_stats.get) if product_stats else "N/A"
     best_prod_qty = product_stats[best_prod_name] if product_stats else 0
 
-    # --- 5. FORMAT OUTPUT ---
+    # --- 6. FORMAT OUTPUT ---
     return {
         "period": {"start": start_date, "end": end_date},
         "most_completed_visits": winner_visits,
@@ -503,7 +851,7 @@ def fetch_product_stats_in_period(product_name_clean: str, start_date: str, end_
 # 4. MCP TOOLS
 # ==========================================
 
-@mcp.tool()
+@threaded_tool
 def fetch_deduplicated_visit_report() -> List[Dict]:
     """
     Retrieves a consolidated report of 'Planned Visits' grouped by standardized Customer ID (CID).
@@ -512,22 +860,14 @@ def fetch_deduplicated_visit_report() -> List[Dict]:
     visit_counts = defaultdict(int)
     query_plans = text("SELECT custcode, COUNT(*) as c FROM plans GROUP BY custcode")
     with engine.connect() as conn:
-        for row in conn.execute(query_plans):
+        for row in conn.execute(query_plans, execution_options={"yield_per": STREAM_BATCH_SIZE}):
             visit_counts[str(row.custcode)] = row.c
 
     # 2. Get Internal ID to Name Map (for fallback)
-    internal_name_map = {}
-    internal_customers = []
-    query_cust = text("SELECT id, custname FROM customers")
-    with engine.connect() as conn:
-        for row in conn.execute(query_cust):
-            c_id = str(row.id)
-            c_name = normalize_name(row.custname)
-            internal_customers.append({
-                "id": c_id,
-                "clean": c_name
-            })
-            internal_name_map[c_id] = row.custname
+    # The cached directory already holds every named customer with its clean
+    # name; unnamed ones have no clean name and are skipped below anyway
+    internal_customers = load_customer_directory()
+    internal_name_map = {cust['id']: cust['name'] for cust in internal_customers}
 
     # 3. Get Name to CID Maps
     map_name_to_cid = load_name_to_cid_map()
@@ -571,7 +911,7 @@ def fetch_deduplicated_visit_report() -> List[Dict]:
     # --- RETURN LIST[DICT] ---
     return final_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_deduplicated_sales_report(start_date: str = None, end_date: str = None) -> List[Dict]:
     """
     Retrieves a consolidated Sales Performance Report grouped by Salesman.
@@ -584,33 +924,30 @@ def fetch_deduplicated_sales_report(start_date: str = None, end_date: str = None
     # 1. Apply Date Logic
     final_start, final_end = get_default_dates(start_date, end_date)
 
-    id_map, code_map, digit_map, name_list = load_official_users_map()
+    id_map, code_map, digit_map, name_map = load_official_users_map()
     
     query = text("""
-        SELECT salesman_name, COUNT(*) as c 
+        SELECT LOWER(TRIM(salesman_name)) as salesman_name, COUNT(*) as c 
         FROM transactions 
         WHERE inv_date BETWEEN :start AND :end
-        GROUP BY salesman_name
+        GROUP BY LOWER(TRIM(salesman_name))
     """)
     
     official_counts = defaultdict(int)
     unmatched_counts = defaultdict(int)
     
     with engine.connect() as conn:
-        for row in conn.execute(query, {"start": final_start, "end": final_end}):
-            raw_field = str(row.salesman_name)
-            count = row.c
-            parts = re.split(r'[/\&,]', raw_field)
-            for part in parts:
-                part = part.strip()
-                if not part: continue
-                resolved_id = resolve_salesman_identity(part, code_map, digit_map, name_list)
-                if resolved_id: 
-                    official_counts[resolved_id] += count
-                else:
-                    core_unmatched = clean_salesman_name(part)
-                    if not core_unmatched: core_unmatched = part.strip()
-                    unmatched_counts[core_unmatched.title()] += count
+        part_counts = count_salesman_parts(conn.execute(query, {"start": final_start, "end": final_end}))
+    resolved_ids = resolve_salesman_identities(part_counts, code_map, digit_map, name_map)
+    
+    for part, count in part_counts.items():
+        resolved_id = resolved_ids[part]
+        if resolved_id: 
+            official_counts[resolved_id] += count
+        else:
+            core_unmatched = clean_salesman_name(part)
+            if not core_unmatched: core_unmatched = part
+            unmatched_counts[core_unmatched.title()] += count
 
     output_rows = []
     for user_id, total in official_counts.items():
@@ -624,7 +961,7 @@ def fetch_deduplicated_sales_report(start_date: str = None, end_date: str = None
     # --- RETURN LIST[DICT] ---
     return output_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_transaction_report_by_customer_name(start_date: str = None, end_date: str = None) -> List[Dict]:
     """
     Retrieves transaction counts grouped by standardized Customer ID (CID).
@@ -649,7 +986,10 @@ def fetch_transaction_report_by_customer_name(start_date: str = None, end_date:
     map_cid_to_name = load_acc_cid_map()
     
     with engine.connect() as conn:
-        for row in conn.execute(query, {"start": final_start, "end": final_end}):
+        for row in conn.execute(
+            query, {"start": final_start, "end": final_end},
+            execution_options={"yield_per": STREAM_BATCH_SIZE}
+        ):
             raw_cid = str(row.cust_id)
             count = row.c
             std_cid = standardize_customer_id(raw_cid)
@@ -664,17 +1004,17 @@ def fetch_transaction_report_by_customer_name(start_date: str = None, end_date:
     
     return output_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_visit_plans_by_salesman() -> List[Dict]:
     """
     Retrieves the count of 'Planned Visits' grouped by Salesman.
     """
     id_map, _, _, _ = load_official_users_map()
-    query = text("SELECT userid, COUNT(*) as c FROM plans GROUP BY userid")
+    query = PLANS_PER_USER_QUERY
     output_rows = []
     with engine.connect() as conn:
         for row in conn.execute(query):
-            u_id = str(row.userid)
+            u_id = row.userid
             user = id_map.get(u_id)
             if user:
                 output_rows.append({"user_id": user['code'], "name": user['name'], "count": row.c})
@@ -685,7 +1025,23 @@ def fetch_visit_plans_by_salesman() -> List[Dict]:
     
     return output_rows
 
-@mcp.tool()
+def resolve_product_bucket(raw_name: str, product_phrases, target_clean_names) -> str:
+    """
+    Maps a raw transaction product name to its official product name
+    (phrase match, then fuzzy match) or an '[Uncategorized] ...' label.
+    """
+    clean_raw = normalize_product_name(raw_name)
+    if clean_raw:
+        official = find_product_in_text(clean_raw, product_phrases)
+        if official:
+            return official['name']
+        match_clean = get_fuzzy_match(clean_raw, target_clean_names, threshold=0.70)
+        if match_clean and match_clean in product_phrases:
+            return product_phrases[match_clean][1]['name']
+    clean_display = clean_raw.title() if clean_raw else "[Unknown Product]"
+    return f"[Uncategorized] {clean_display}"
+
+@threaded_tool
 def fetch_transaction_report_by_product(start_date: str = None, end_date: str = None) -> List[Dict]:
     """
     Retrieves sales performance grouped by Product (Units Sold & Revenue).
@@ -697,9 +1053,7 @@ def fetch_transaction_report_by_product(start_date: str = None, end_date: str =
     """
     final_start, final_end = get_default_dates(start_date, end_date)
 
-    id_to_name, official_products = load_product_directory()
-    official_products.sort(key=lambda x: len(x['clean']), reverse=True)
-    target_clean_names = [x['clean'] for x in official_products]
+    id_to_name, _, target_clean_names, product_phrases = load_product_matcher()
     
     query = text("""
         SELECT item_id, product, SUM(qty) as units, CAST(SUM(amount) AS DECIMAL(65, 0)) as revenue 
@@ -708,6 +1062,9 @@ def fetch_transaction_report_by_product(start_date: str = None, end_date: str =
         GROUP BY item_id, product
     """)
     grouped_data = defaultdict(lambda: {"count": 0, "revenue": 0})
+    # Rows are grouped by (item_id, product), so one product name can recur
+    # under many item IDs; its name-based bucket is resolved only once
+    name_buckets = {}  # raw product name -> grouped_data key
     
     with engine.connect() as conn:
         for row in conn.execute(query, {"start": final_start, "end": final_end}):
@@ -716,36 +1073,15 @@ def fetch_transaction_report_by_product(start_date: str = None, end_date: str =
             units = int(row.units) if row.units else 0
             revenue = int(row.revenue) if row.revenue else 0
             
-            clean_raw = normalize_product_name(raw_name)
-            match_found = False
-            
             if raw_id and raw_id in id_to_name:
-                grouped_data[id_to_name[raw_id]]["count"] += units
-                grouped_data[id_to_name[raw_id]]["revenue"] += revenue
-                match_found = True
-            
-            if not match_found and clean_raw:
-                for official in official_products:
-                    if f" {official['clean']} " in f" {clean_raw} ":
-                        grouped_data[official['name']]["count"] += units
-                        grouped_data[official['name']]["revenue"] += revenue
-                        match_found = True
-                        break 
-            
-            if not match_found and clean_raw:
-                match_clean = get_fuzzy_match(clean_raw, target_clean_names, threshold=0.70)
-                if match_clean:
-                    official_entry = next((x for x in official_products if x['clean'] == match_clean), None)
-                    if official_entry:
-                        grouped_data[official_entry['name']]["count"] += units
-                        grouped_data[official_entry['name']]["revenue"] += revenue
-                        match_found = True
+                bucket = id_to_name[raw_id]
+            else:
+                if raw_name not in name_buckets:
+                    name_buckets[raw_name] = resolve_product_bucket(raw_name, product_phrases, target_clean_names)
+                bucket = name_buckets[raw_name]
             
-            if not match_found:
-                clean_display = clean_raw.title() if clean_raw else "[Unknown Product]"
-                display_name = f"[Uncategorized] {clean_display}"
-                grouped_data[display_name]["count"] += units
-                grouped_data[display_name]["revenue"] += revenue
+            grouped_data[bucket]["count"] += units
+            grouped_data[bucket]["revenue"] += revenue
 
     output_rows = []
     for name, data in grouped_data.items():
@@ -754,7 +1090,7 @@ def fetch_transaction_report_by_product(start_date: str = None, end_date: str =
     
     return output_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_visit_plans_by_clinic() -> List[Dict]:
     """
     Retrieves 'Planned Visits' grouped by Clinic, distinguishing branches by City.
@@ -764,20 +1100,23 @@ def fetch_visit_plans_by_clinic() -> List[Dict]:
     visit_counts = defaultdict(int)
     
     with engine.connect() as conn:
-        for row in conn.execute(query):
+        for row in conn.execute(query, execution_options={"yield_per": STREAM_BATCH_SIZE}):
             visit_counts[str(row.cliniccode)] = row.c
             
     final_output = []
     for bucket_key, clinics in city_buckets.items():
         grouped_map = defaultdict(list)
-        clinics.sort(key=lambda x: len(x['clean']), reverse=True)
-        for clinic in clinics:
+        group_keys = []  # Grows alongside grouped_map instead of being rebuilt per clinic
+        for clinic in sorted(clinics, key=lambda x: len(x['clean']), reverse=True):
             core_name = clinic['clean']
-            if not core_name: continue 
-            potential_matches = list(grouped_map.keys())
-            match = get_fuzzy_match(core_name, potential_matches, threshold=0.88)
+            if not core_name: continue
+            # Branches sharing the exact same clean name are common; only score new names
+            if core_name in grouped_map: match = core_name
+            else: match = get_fuzzy_match(core_name, group_keys, threshold=0.88)
             if match: grouped_map[match].append(clinic)
-            else: grouped_map[core_name].append(clinic)
+            else:
+                grouped_map[core_name].append(clinic)
+                group_keys.append(core_name)
         
         for clean_key, entries in grouped_map.items():
             ids = [x['id'] for x in entries]
@@ -793,17 +1132,17 @@ def fetch_visit_plans_by_clinic() -> List[Dict]:
     
     return final_output
 
-@mcp.tool()
+@threaded_tool
 def fetch_report_counts_by_salesman() -> List[Dict]:
     """
     Retrieves the count of *Completed* Visits (Reports) grouped by Salesman.
     """
     id_map, _, _, _ = load_official_users_map()
-    query = text("SELECT p.userid, COUNT(r.id) as c FROM reports r JOIN plans p ON r.idplan = p.id GROUP BY p.userid")
+    query = REPORTS_PER_USER_QUERY
     output_rows = []
     with engine.connect() as conn:
         for row in conn.execute(query):
-            u_id = str(row.userid)
+            u_id = row.userid
             user = id_map.get(u_id)
             if user:
                 output_rows.append({"user_id": user['code'], "name": user['name'], "count": row.c})
@@ -813,33 +1152,35 @@ def fetch_report_counts_by_salesman() -> List[Dict]:
     
     return output_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_comprehensive_salesman_performance() -> List[Dict]:
     """
     Retrieves a 360-degree 'Scorecard' for Salesmen (Plans vs Visits vs Sales).
     """
-    id_map, code_map, digit_map, name_list = load_official_users_map()
+    id_map, code_map, digit_map, name_map = load_official_users_map()
     master_data = defaultdict(lambda: {'plans': 0, 'reports': 0, 'transactions': 0})
 
+    # The two aggregates are independent, so they run at once on separate
+    # pooled connections; their rows are still applied in the order below
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        plan_rows, report_rows = executor.map(
+            fetch_all_rows, (PLANS_PER_USER_QUERY, REPORTS_PER_USER_QUERY)
+        )
+
     # Plans
-    with engine.connect() as conn:
-        for row in conn.execute(text("SELECT userid, COUNT(*) as c FROM plans GROUP BY userid")):
-            if str(row.userid) in id_map: master_data[str(row.userid)]['plans'] += row.c
+    for row in plan_rows:
+        if row.userid in id_map: master_data[row.userid]['plans'] += row.c
     
     # Reports
-    with engine.connect() as conn:
-        for row in conn.execute(text("SELECT p.userid, COUNT(r.id) as c FROM reports r JOIN plans p ON r.idplan = p.id GROUP BY p.userid")):
-            if str(row.userid) in id_map: master_data[str(row.userid)]['reports'] += row.c
+    for row in report_rows:
+        if row.userid in id_map: master_data[row.userid]['reports'] += row.c
 
     # Transactions
-    with engine.connect() as conn:
-        for row in conn.execute(text("SELECT salesman_name, COUNT(*) as c FROM transactions GROUP BY salesman_name")):
-            parts = re.split(r'[/\&,]', str(row.salesman_name))
-            for part in parts:
-                part = part.strip()
-                if not part: continue
-                resolved_id = resolve_salesman_identity(part, code_map, digit_map, name_list)
-                if resolved_id: master_data[resolved_id]['transactions'] += row.c
+    part_counts = load_salesman_transaction_part_counts()
+    resolved_ids = resolve_salesman_identities(part_counts, code_map, digit_map, name_map)
+    for part, count in part_counts.items():
+        resolved_id = resolved_ids[part]
+        if resolved_id: master_data[resolved_id]['transactions'] += count
 
     output_rows = []
     for uid, stats in master_data.items():
@@ -858,7 +1199,7 @@ def fetch_comprehensive_salesman_performance() -> List[Dict]:
     
     return output_rows
 
-@mcp.tool()
+@threaded_tool
 def fetch_salesman_visit_history(salesman_name: str) -> Dict[str, Any]:
     """
     Fetches detailed visit notes and transaction stats for a SPECIFIC salesman.
@@ -882,7 +1223,7 @@ def fetch_salesman_visit_history(salesman_name: str) -> Dict[str, Any]:
 
     return fetch_single_salesman_data(salesman_name)
 
-@mcp.tool()
+@threaded_tool
 def fetch_salesman_comparison_data(salesman_a: str, salesman_b: str) -> Dict[str, Any]:
     """
     Fetches side-by-side visit notes and transaction stats for TWO salesmen.
@@ -904,12 +1245,15 @@ def fetch_salesman_comparison_data(salesman_a: str, salesman_b: str) -> Dict[str
         Use when the user asks to "compare Wilson and Gladys", "who is better between A and B"
         or "compare visit effectiveness of A vs B".
     """
-    report_a = fetch_single_salesman_data(salesman_a)
-    report_b = fetch_single_salesman_data(salesman_b)
-    
+    # The two lookups are independent, so overlap their database round-trips
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        future_a = executor.submit(fetch_single_salesman_data, salesman_a)
+        future_b = executor.submit(fetch_single_salesman_data, salesman_b)
+        report_a, report_b = future_a.result(), future_b.result()
+
     return {"salesman_a": report_a, "salesman_b": report_b}
 
-@mcp.tool()
+@threaded_tool
 def fetch_best_performers(start_date: str = None, end_date: str = None) -> Dict[str, Any]:
     """
     Fetches a leaderboard of best performing salesmen and products within a date range or overall.
@@ -940,7 +1284,7 @@ def fetch_best_performers(start_date: str = None, end_date: str = None) -> Dict[
     
     return fetch_best_performers_logic(final_start, final_end)
 
-@mcp.tool()
+@threaded_tool
 def fetch_transaction_counts_by_user_level(target_levels: str = None) -> Dict[str, Any]:
     """
     Calculates the number of transactions grouped by User Level (e.g., DC, TS, AM, NULL).
@@ -966,7 +1310,7 @@ def fetch_transaction_counts_by_user_level(target_levels: str = None) -> Dict[st
         "Compare transactions between DC and TS", or "Show transactions for users with no level".
     """
     # 1. Load Data
-    id_map, code_map, digit_map, name_list = load_official_users_map()
+    id_map, code_map, digit_map, name_map = load_official_users_map()
     
     # 2. Parse Filter
     filters = []
@@ -976,23 +1320,17 @@ def fetch_transaction_counts_by_user_level(target_levels: str = None) -> Dict[st
     # 3. Aggregate Counts
     level_counts = defaultdict(int)
     
-    query = text("SELECT salesman_name, COUNT(*) as c FROM transactions GROUP BY salesman_name")
+    part_counts = load_salesman_transaction_part_counts()
+    resolved_ids = resolve_salesman_identities(part_counts, code_map, digit_map, name_map)
     
-    with engine.connect() as conn:
-        for row in conn.execute(query):
-            raw_field = str(row.salesman_name)
-            count = row.c
-            parts = re.split(r'[/\&,]', raw_field)
-            for part in parts:
-                part = part.strip()
-                if not part: continue
-                resolved_id = resolve_salesman_identity(part, code_map, digit_map, name_list)
-                user_level = "UNKNOWN"
-                if resolved_id:
-                    user_level = id_map[resolved_id].get('level', "NULL")
-                else:
-                    user_level = "UNIDENTIFIED"
-                level_counts[user_level] += count
+    for part, count in part_counts.items():
+        resolved_id = resolved_ids[part]
+        user_level = "UNKNOWN"
+        if resolved_id:
+            user_level = id_map[resolved_id].get('level', "NULL")
+        else:
+            user_level = "UNIDENTIFIED"
+        level_counts[user_level] += count
 
     # 4. Filter and Format Results
     final_rows = []
@@ -1011,7 +1349,7 @@ def fetch_transaction_counts_by_user_level(target_levels: str = None) -> Dict[st
         "filters_applied": filters if filters else "ALL"
     }
 
-@mcp.tool()
+@threaded_tool
 def analyze_product_sales_growth(
     product_name: str, 
     period1_start: str, 
@@ -1097,6 +1435,22 @@ def analyze_product_sales_growth(
         }
     }
 
+@threaded_tool
+def invalidate_reference_cache() -> Dict[str, Any]:
+    """
+    Reloads the cached reference data (users, customers, products, clinics)
+    from the database right away instead of waiting for the TTL to expire,
+    and drops the cached salesman transaction totals so they reload on next use.
+    Run this after the reference tables have been updated.
+    """
+    refresh_reference_data()
+    cleared = invalidate_caches()
+    return {
+        "refreshed": len(_CACHED_LOADERS) - cleared,
+        "cleared": cleared,
+        "ttl_seconds": CACHE_TTL_SECONDS
+    }
+
 # ==========================================
 # 5. MCP PROMPTS
 # ==========================================
@@ -1341,7 +1695,17 @@ def analyze_product_growth_between_periods() -> str:
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
     print("--- BAM Analytics Server Starting ---")
+    # Warm the reference maps so the first tool call does not pay for them
+    try:
+        await asyncio.to_thread(preload_reference_data)
+    except Exception as e:
+        print(f"Reference data preload failed: {e}")
+    refresh_task = asyncio.create_task(refresh_reference_data_periodically())
     yield
+    refresh_task.cancel()
+    # Wait for the task to finish so no refresh is still using the engine
+    with contextlib.suppress(asyncio.CancelledError):
+        await refresh_task
     print("--- Server Shutting Down ---")
 
 # Initialize FastAPI app
@@ -1367,59 +1731,61 @@ app.add_middleware(
 app.mount("/mcp", mcp.sse_app())
 
 # API Endpoints
+# Data endpoints declare their return types so FastAPI serializes the (often large)
+# report payloads straight to JSON bytes through Pydantic instead of jsonable_encoder
 @app.get("/")
 async def root():
     return {"message": "BAM MCP Server is running. Access MCP at /mcp/sse"}
 
 @app.get("/visits/customers")
-def get_visits_by_customer():
+def get_visits_by_customer() -> List[Dict]:
     return fetch_deduplicated_visit_report()
 
 @app.get("/visits/salesmen")
-def get_visits_by_salesman():
+def get_visits_by_salesman() -> List[Dict]:
     return fetch_visit_plans_by_salesman()
 
 @app.get("/visits/clinics")
-def get_visits_by_clinic():
+def get_visits_by_clinic() -> List[Dict]:
     return fetch_visit_plans_by_clinic()
 
 @app.get("/transactions/customers")
-def get_transactions_by_customer():
+def get_transactions_by_customer() -> List[Dict]:
     return fetch_transaction_report_by_customer_name()
 
 @app.get("/transactions/salesmen")
-def get_transactions_by_salesman():
+def get_transactions_by_salesman() -> List[Dict]:
     return fetch_deduplicated_sales_report()
 
 @app.get("/transactions/products")
-def get_transactions_by_product():
+def get_transactions_by_product() -> List[Dict]:
     return fetch_transaction_report_by_product()
 
 @app.get("/transactions/levels")
-def get_transactions_by_level(levels: Optional[str] = Query(None, description="Comma-separated levels (DC, TS, NULL)")):
+def get_transactions_by_level(levels: Optional[str] = Query(None, description="Comma-separated levels (DC, TS, NULL)")) -> Dict[str, Any]:
     return fetch_transaction_counts_by_user_level(levels)
 
 @app.get("/reports/salesmen")
-def get_reports_by_salesman():
+def get_reports_by_salesman() -> List[Dict]:
     return fetch_report_counts_by_salesman()
 
 @app.get("/performance/salesmen")
-def get_salesman_performance_scorecard():
+def get_salesman_performance_scorecard() -> List[Dict]:
     return fetch_comprehensive_salesman_performance()
 
 @app.get("/performance/best")
 def get_best_performers(
     start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="YYYY-MM-DD")
-):
+) -> Dict[str, Any]:
     return fetch_best_performers(start_date, end_date)
 
 @app.get("/analysis/salesman/{name}")
-def analyze_salesman_effectiveness(name: str):
+def analyze_salesman_effectiveness(name: str) -> Dict[str, Any]:
     return fetch_salesman_visit_history(name)
 
 @app.get("/analysis/compare")
-def compare_salesmen(salesman_a: str, salesman_b: str):
+def compare_salesmen(salesman_a: str, salesman_b: str) -> Dict[str, Any]:
     return fetch_salesman_comparison_data(salesman_a, salesman_b)
 
 @app.get("/analysis/growth/product")
@@ -1427,14 +1793,22 @@ def get_product_growth_analysis(
     product: str,
     p1_start: str, p1_end: str,
     p2_start: str, p2_end: str
-):
+) -> Dict[str, Any]:
     return analyze_product_sales_growth(product, p1_start, p1_end, p2_start, p2_end)
 
+# Tool schemas are fixed once the module has registered them, so the listing is built once
+_tools_listing: Optional[Dict[str, Any]] = None
+
 @app.get("/tools")
-async def list_tools():
+async def list_tools(refresh: bool = Query(False, description="Rebuild the cached tool listing")):
     """
     Simple endpoint to list all registered tools with their input schemas.
+    The listing is computed on first request and reused until refreshed.
     """
+    global _tools_listing
+    if _tools_listing is not None and not refresh:
+        return _tools_listing
+
     tools_data = []
     
     source = None
@@ -1459,10 +1833,11 @@ async def list_tools():
                 "input_schema": schema
             })
             
-    return {
+    _tools_listing = {
         "count": len(tools_data),
         "tools": tools_data
     }
+    return _tools_listing
 
 # ==========================================
 # 7. ENTRY POINT
@@ -1,5 +1,6 @@
 import os
 import re
+import mmap
 import mysql.connector
 from dotenv import load_dotenv
 from collections import Counter
@@ -16,139 +17,168 @@ db = mysql.connector.connect(
 )
 mycursor = db.cursor()
 
+# INSERT INTO `table` (`col1`, `col2`) VALUES
+# Bytes pattern so it can run directly against the memory-mapped dump
+INSERT_HEADER_RE = re.compile(rb"INSERT INTO `(\w+)` \s*\((.*?)\)\s*VALUES", re.IGNORECASE | re.DOTALL)
+
+# A quote or the statement terminator, searched for in the raw dump bytes
+STATEMENT_DELIM_RE = re.compile(rb"[';]")
+
+# Characters that can end or split a field while outside a quoted string
+TUPLE_DELIM_RE = re.compile(r"[',)]")
+
+def split_sql_tuple(text, start):
+    """
+    Splits the '(...)' tuple opening at text[start] into raw field strings.
+    Quoted fields keep their quotes so callers can tell strings from NULL/numbers.
+    Returns (fields, end) with end at the closing ')', or (None, -1) if unterminated.
+    """
+    fields = []
+    field_start = start + 1
+    pos = start + 1
+    
+    while True:
+        match = TUPLE_DELIM_RE.search(text, pos)
+        if not match:
+            return None, -1
+        pos = match.start()
+        char = text[pos]
+        
+        if char == "'":
+            # Jump to the closing quote, skipping backslash-escaped ones
+            pos = text.find("'", pos + 1)
+            while pos != -1 and text[pos-1] == '\\':
+                pos = text.find("'", pos + 1)
+            if pos == -1:
+                return None, -1
+        elif char == ',':
+            fields.append(text[field_start:pos].strip())
+            field_start = pos + 1
+        else:
+            fields.append(text[field_start:pos].strip())
+            return fields, pos
+        pos += 1
+
+def find_statement_end(buf, pos):
+    """
+    Returns the index of the ';' terminating the statement that continues at buf[pos],
+    skipping semicolons inside quoted strings, or len(buf) if there is none.
+    """
+    while True:
+        match = STATEMENT_DELIM_RE.search(buf, pos)
+        if not match:
+            return len(buf)
+        pos = match.start()
+        if buf[pos:pos+1] == b';':
+            return pos
+        # Jump to the closing quote, skipping backslash-escaped ones
+        pos = buf.find(b"'", pos + 1)
+        while pos != -1 and buf[pos-1:pos] == b'\\':
+            pos = buf.find(b"'", pos + 1)
+        if pos == -1:
+            return len(buf)
+        pos += 1
+
 def parse_sql_file(file_path):
     customers = {} # id -> name
     plans_counts = Counter() # customer_id -> count
     transactions_counts = Counter() # cust_id (CID...) -> count
 
     print(f"Reading {file_path}...")
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
+    if os.path.getsize(file_path) == 0:
+        return customers, plans_counts, transactions_counts
 
-    # Split into statements using semicolon
-    # This is a naive split but accurate enough for SQL dumps unless ; is in string
-    statements = content.split(';')
+    # Walk the dump linearly from one INSERT header to the next instead of
+    # splitting on ';', which also cut statements whose strings held a semicolon.
+    # The file is memory-mapped and only the statements of the tables we need
+    # are decoded, so the rest of the dump never becomes a Python str.
+    print("Scanning INSERT statements...")
+    statement_count = 0
+    pos = 0
     
-    print(f"Parsing {len(statements)} statements...")
-    
-    for stmt in statements:
-        stmt = stmt.strip()
-        if not stmt.upper().startswith("INSERT INTO"):
-            continue
-            
-        # Match table name and columns
-        # INSERT INTO `table` (`col1`, `col2`) VALUES
-        header_match = re.match(r"INSERT INTO `(\w+)` \s*\((.*?)\)\s*VALUES", stmt, re.IGNORECASE | re.DOTALL)
-        if not header_match:
-            continue
-            
-        table = header_match.group(1).lower()
-        if table not in ['customers', 'plans', 'transactions']:
-            continue
-            
-        columns_str = header_match.group(2)
-        columns = [c.strip().strip('`') for c in columns_str.split(',')]
-        
-        # Get values part
-        values_part = stmt[header_match.end():].strip()
-        
-        # Parse values tuples
-        # We need to iterate carefully.
-        # Format is (val1, val2), (val3, val4)
-        
-        # Simple parser for values
-        # We'll use a regex to capture each tuple (...)
-        # WARNING: This regex might fail on complex nested parenthesis or strings with )
-        # But standard SQL dumps usually structure nicely.
-        # Let's assume standard structure: (..., ..., ...)
-        
-        # Using a simplistic manual parser is safer
-        idx = 0
-        length = len(values_part)
-        
-        while idx < length:
-            # Find start of tuple
-            start = values_part.find('(', idx)
-            if start == -1:
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while True:
+            # Match table name and columns
+            header_match = INSERT_HEADER_RE.search(mm, pos)
+            if not header_match:
                 break
+            pos = header_match.end()
                 
-            # Find end of tuple. Must handle quotes.
-            end = -1
-            cursor = start + 1
-            in_quote = False
-            
-            while cursor < length:
-                char = values_part[cursor]
-                if char == "'" and (cursor == 0 or values_part[cursor-1] != '\\'):
-                    in_quote = not in_quote
-                elif char == ')' and not in_quote:
-                    end = cursor
-                    break
-                cursor += 1
-            
-            if end == -1:
-                break
+            table = header_match.group(1).decode('utf-8', 'ignore').lower()
+            if table not in ['customers', 'plans', 'transactions']:
+                # Skip the whole statement so text inside its values is never
+                # mistaken for the next INSERT header
+                pos = find_statement_end(mm, pos)
+                continue
+            statement_count += 1
                 
-            # Extract tuple content
-            tuple_content = values_part[start+1:end]
-            
-            # Parse fields
-            fields = []
-            f_cursor = 0
-            f_len = len(tuple_content)
-            current_field = []
-            f_in_quote = False
+            columns_str = header_match.group(2).decode('utf-8', 'ignore')
+            columns = [c.strip().strip('`') for c in columns_str.split(',')]
             
-            while f_cursor < f_len:
-                char = tuple_content[f_cursor]
-                if char == "'" and (f_cursor == 0 or tuple_content[f_cursor-1] != '\\'):
-                    f_in_quote = not f_in_quote
-                    current_field.append(char) # Keep quotes for now to identify strings
-                elif char == ',' and not f_in_quote:
-                    fields.append("".join(current_field).strip())
-                    current_field = []
-                else:
-                    current_field.append(char)
-                f_cursor += 1
-            fields.append("".join(current_field).strip())
+            end_of_statement = find_statement_end(mm, pos)
+            content = mm[pos:end_of_statement].decode('utf-8', 'ignore')
+            pos = end_of_statement
             
-            # Clean fields
-            clean_fields = []
-            for field in fields:
-                if field.startswith("'") and field.endswith("'"):
-                    # String
-                    val = field[1:-1].replace("\\'", "'").replace("\\n", "\n")
-                    clean_fields.append(val)
-                elif field.upper() == 'NULL':
-                    clean_fields.append(None)
-                else:
-                    # Number
-                    try:
-                        clean_fields.append(int(field))
-                    except:
-                        clean_fields.append(field)
-            
-            # Map to columns
-            if len(clean_fields) == len(columns):
-                row = dict(zip(columns, clean_fields))
-                
-                if table == 'customers':
-                    if 'id' in row and 'custname' in row:
-                        customers[row['id']] = row['custname']
-                elif table == 'plans':
-                    if 'custcode' in row:
-                        plans_counts[row['custcode']] += 1
-                elif table == 'transactions':
-                    if 'cust_id' in row:
-                        transactions_counts[row['cust_id']] += 1
-                        
-            idx = end + 1
-            # Skip comma and whitespace
-            while idx < length and values_part[idx] in [',', ' ', '\n', '\r', '\t']:
-                idx += 1
+            parse_values(content, table, columns, customers, plans_counts, transactions_counts)
+    
+    print(f"Parsed {statement_count} INSERT statements.")
 
     return customers, plans_counts, transactions_counts
 
+def parse_values(content, table, columns, customers, plans_counts, transactions_counts):
+    """
+    Parses the '(...), (...)' tuples of one INSERT statement body and
+    accumulates them into the per-table collections.
+    """
+    # Format is (val1, val2), (val3, val4)
+    idx = 0
+    length = len(content)
+    
+    while idx < length:
+        # Skip comma and whitespace; anything other than '(' ends the statement
+        while idx < length and content[idx] in [',', ' ', '\n', '\r', '\t']:
+            idx += 1
+        if idx >= length or content[idx] != '(':
+            break
+        start = idx
+            
+        # Find end of tuple and split its fields in a single pass
+        fields, end = split_sql_tuple(content, start)
+        if end == -1:
+            break
+        
+        # Clean fields
+        clean_fields = []
+        for field in fields:
+            if field.startswith("'") and field.endswith("'"):
+                # String
+                val = field[1:-1].replace("\\'", "'").replace("\\n", "\n")
+                clean_fields.append(val)
+            elif field.upper() == 'NULL':
+                clean_fields.append(None)
+            else:
+                # Number
+                try:
+                    clean_fields.append(int(field))
+                except:
+                    clean_fields.append(field)
+        
+        # Map to columns
+        if len(clean_fields) == len(columns):
+            row = dict(zip(columns, clean_fields))
+            
+            if table == 'customers':
+                if 'id' in row and 'custname' in row:
+                    customers[row['id']] = row['custname']
+            elif table == 'plans':
+                if 'custcode' in row:
+                    plans_counts[row['custcode']] += 1
+            elif table == 'transactions':
+                if 'cust_id' in row:
+                    transactions_counts[row['cust_id']] += 1
+                    
+        idx = end + 1
+
 def generate():
     sql_path = os.path.join(os.path.dirname(__file__), 'real_data.sql')
     customers, plans_counts, transactions_counts = parse_sql_file(sql_path)